@@ -1,10 +1,25 @@
+from hashlib import blake2b
+
 from django import forms
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.contrib.auth import password_validation
+from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, UsernameField
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.functions import Lower
 from django_recaptcha.fields import ReCaptchaField
 
 from .models import Profile
 
+BASE_ATTRS = {"class": "form-control", "autocomplete": "off"}
+
+
+def email_taken_cache_key(email):
+    """
+    Ключ кэша для результата проверки email на уникальность
+    """
+    digest = blake2b(email.lower().encode(), digest_size=8).hexdigest()
+    return f'email-taken-{digest}'
+
 
 class UserUpdateForm(forms.ModelForm):
     """
@@ -39,7 +54,10 @@ class UserUpdateForm(forms.ModelForm):
         Проверка email на уникальность
         """
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
+        if email and (User.objects.alias(email_lower=Lower('email'))
+                      .filter(email_lower=email.lower())
+                      .exclude(pk=self.instance.pk)
+                      .only('pk').exists()):
             raise forms.ValidationError('Email адрес должен быть уникальным')
         return email
 
@@ -70,70 +88,80 @@ class UserRegisterForm(UserCreationForm):
     """
     Переопределенная форма регистрации пользователей
     """
+    password1 = forms.CharField(
+        label='Пароль',
+        strip=False,
+        widget=forms.PasswordInput(attrs={**BASE_ATTRS, "placeholder": "Придумайте свой пароль"}),
+        help_text=password_validation.password_validators_help_text_html()
+    )
+    password2 = forms.CharField(
+        label='Подтверждение пароля',
+        strip=False,
+        widget=forms.PasswordInput(attrs={**BASE_ATTRS, "placeholder": "Повторите придуманный пароль"}),
+        help_text='Для подтверждения введите, пожалуйста, пароль ещё раз.'
+    )
 
     class Meta(UserCreationForm.Meta):
         fields = (
             'username', 'password1', 'password2',
             'email', 'first_name', 'last_name'
         )
+        widgets = {
+            'username': forms.TextInput(attrs={**BASE_ATTRS, "placeholder": "Придумайте свой логин"}),
+            'email': forms.EmailInput(attrs={**BASE_ATTRS, "placeholder": "Введите свой email"}),
+            'first_name': forms.TextInput(attrs={**BASE_ATTRS, "placeholder": "Ваше имя"}),
+            'last_name': forms.TextInput(attrs={**BASE_ATTRS, "placeholder": "Ваша фамилия"}),
+        }
 
     def clean_email(self):
         """
         Проверка email на уникальность
         """
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email=email).exists():
+        if not email:
+            return email
+        cache_key = email_taken_cache_key(email)
+        email_taken = cache.get(cache_key)
+        if email_taken is None:
+            email_taken = (User.objects.alias(email_lower=Lower('email'))
+                           .filter(email_lower=email.lower())
+                           .only('pk').exists())
+            cache.set(cache_key, email_taken, 30)
+        if email_taken:
             raise forms.ValidationError(
                 'Такой email уже используется в системе'
             )
         return email
 
-    def __init__(self, *args, **kwargs):
-        """
-        Обновление стилей формы регистрации
-        """
-        super().__init__(*args, **kwargs)
-        self.fields['username'].widget.attrs.update(
-            {"placeholder": "Придумайте свой логин"}
-        )
-        self.fields['password1'].widget.attrs.update(
-            {"placeholder": "Придумайте свой пароль"}
-        )
-        self.fields['password2'].widget.attrs.update(
-            {"placeholder": "Повторите придуманный пароль"}
-        )
-        self.fields['email'].widget.attrs.update(
-            {"placeholder": "Введите свой email"}
-        )
-        self.fields['first_name'].widget.attrs.update(
-            {"placeholder": "Ваше имя"}
-        )
-        self.fields['last_name'].widget.attrs.update(
-            {"placeholder": "Ваша фамилия"}
-        )
-        for field in self.fields:
-            self.fields[field].widget.attrs.update(
-                {"class": "form-control", "autocomplete": "off"}
-            )
+
+# UsernameField.widget_attrs при создании поля ставит autocomplete="username"
+# поверх атрибутов из Meta.widgets, поэтому возвращаем "off" уже у готового поля
+UserRegisterForm.base_fields['username'].widget.attrs['autocomplete'] = 'off'
 
 
 class UserLoginForm(AuthenticationForm):
     """
     Форма авторизации на сайте
     """
-
+    username = UsernameField(
+        label='Логин',
+        widget=forms.TextInput(attrs={
+            "autofocus": True,
+            "class": "form-control",
+            "placeholder": "Логин пользователя"
+        })
+    )
+    password = forms.CharField(
+        label='Пароль',
+        strip=False,
+        widget=forms.PasswordInput(attrs={
+            "autocomplete": "current-password",
+            "class": "form-control",
+            "placeholder": "Пароль пользователя"
+        })
+    )
     recaptcha = ReCaptchaField()
 
     class Meta:
         model = User
         fields = ['username', 'password', 'recaptcha']
-    def __init__(self, *args, **kwargs):
-        """
-        Обновление атрибутов полей формы регистрации
-        """
-        super().__init__(*args, **kwargs)
-        self.fields['username'].widget.attrs['placeholder'] = 'Логин пользователя'
-        self.fields['username'].widget.attrs['class'] = 'form-control'
-        self.fields['password'].widget.attrs['placeholder'] = 'Пароль пользователя'
-        self.fields['password'].widget.attrs['class'] = 'form-control'
-        self.fields['username'].label = 'Логин'
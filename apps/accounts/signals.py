@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.models.signals import post_migrate, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.cache import cache
 
+from .forms import email_taken_cache_key
 from .models import Profile
 
 
@@ -9,3 +12,23 @@ from .models import Profile
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def reset_email_taken_cache(sender, instance, **kwargs):
+    if instance.email:
+        cache.delete(email_taken_cache_key(instance.email))
+
+
+@receiver(post_migrate)
+def create_user_email_lower_index(sender, using, **kwargs):
+    """
+    Функциональный индекс LOWER(email) для проверки email на уникальность
+    (таблица auth_user не наша, поэтому индекс создается после миграций)
+    """
+    if sender.name != 'apps.accounts':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS user_email_lower_idx ON auth_user (LOWER(email))'
+        )
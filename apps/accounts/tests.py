@@ -1,3 +1,17 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .forms import UserRegisterForm
+
+
+class UserRegisterFormTest(SimpleTestCase):
+    """
+    Атрибуты полей формы регистрации
+    """
+
+    def test_widget_attrs(self):
+        form = UserRegisterForm()
+        for name in form.fields:
+            attrs = form[name].build_widget_attrs(form.fields[name].widget.attrs)
+            self.assertEqual(attrs['class'], 'form-control')
+            self.assertEqual(attrs['autocomplete'], 'off')
+            self.assertIn('placeholder', attrs)
@@ -1,14 +1,16 @@
 from django.contrib import admin
-from django_mptt_admin.admin import DjangoMpttAdmin
+from treebeard.admin import TreeAdmin
+from treebeard.forms import movenodeform_factory
 
 from .models import Category, Post, Comment, Rating
 
 
 @admin.register(Category)
-class CategoryAdmin(DjangoMpttAdmin):
+class CategoryAdmin(TreeAdmin):
     """
     Админ-панель модели категорий
     """
+    form = movenodeform_factory(Category)
     prepopulated_fields = {'slug': ('title',)}
 
 
@@ -21,11 +23,11 @@ class PostAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdminPage(DjangoMpttAdmin):
+class CommentAdminPage(TreeAdmin):
     """
     Админ-панель модели комментариев
     """
-    pass
+    form = movenodeform_factory(Comment)
 
 
 @admin.register(Rating)
@@ -10,7 +10,7 @@ class LatestPostFeed(Feed):
     description = "Новые записи на моем сайте."
 
     def items(self):
-        return Post.custom.order_by('-update')[:5]
+        return Post.objects.for_list().order_by('-update')[:5]
 
     def item_title(self, item):
         return item.title
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.blog.models import Comment, Post, STATUS_DRAFT, STATUS_PUBLISHED
+
+
+class Command(BaseCommand):
+    """
+    Перевод статусов постов и комментариев из строк в числа.
+    Запускается до migrate: миграция AlterField на PostgreSQL выполняет
+    USING status::smallint и не может привести 'published'/'draft' к числу
+    """
+    help = "Заменяет 'published'/'draft' на 1/0 в колонке status перед миграцией"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            table = model._meta.db_table
+            with connection.cursor() as cursor:
+                description = connection.introspection.get_table_description(cursor, table)
+                column = next(column for column in description if column.name == 'status')
+                if connection.introspection.get_field_type(column.type_code, column) != 'CharField':
+                    self.stdout.write(f'{table}: статус уже хранится числом')
+                    continue
+                cursor.execute(
+                    f"UPDATE {table} SET status = CASE WHEN status = 'published' "
+                    f"THEN '{STATUS_PUBLISHED}' ELSE '{STATUS_DRAFT}' END"
+                )
+                self.stdout.write(self.style.SUCCESS(f'{table}: обновлено строк {cursor.rowcount}'))
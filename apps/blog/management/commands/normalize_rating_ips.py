@@ -0,0 +1,31 @@
+from ipaddress import ip_address
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.blog.models import Rating
+
+
+class Command(BaseCommand):
+    """
+    Приведение сохраненных IPv4-mapped адресов (::ffff:a.b.c.d) к IPv4.
+    Поле ip_address теперь нормализует такие адреса при записи и поиске, поэтому
+    старые строки иначе не находятся и клиент получает вторую оценку
+    """
+    help = 'Переводит ::ffff:a.b.c.d в a.b.c.d в таблице оценок'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        updated = deleted = 0
+        for rating in Rating.objects.filter(ip_address__istartswith='::ffff:'):
+            ipv4 = ip_address(rating.ip_address).ipv4_mapped
+            if ipv4 is None:
+                continue
+            if Rating.objects.filter(post_id=rating.post_id, ip_address=str(ipv4)).exists():
+                # У клиента уже есть оценка с IPv4-адресом: дубль удаляем, сумму поправит сигнал
+                rating.delete()
+                deleted += 1
+            else:
+                Rating.objects.filter(pk=rating.pk).update(ip_address=str(ipv4))
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(f'Обновлено оценок: {updated}, удалено дублей: {deleted}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.blog.models import Post, Rating
+
+
+class Command(BaseCommand):
+    """
+    Пересчёт денормализованной суммы рейтинга постов.
+    Нужен один раз после добавления поля rating_total (для уже существующих оценок),
+    дальше сумму поддерживают сигналы модели рейтинга
+    """
+    help = 'Пересчитывает Post.rating_total по таблице оценок'
+
+    def handle(self, *args, **options):
+        updated = Post.all_objects.update(rating_total=Rating.total_subquery())
+        self.stdout.write(self.style.SUCCESS(f'Пересчитан рейтинг постов: {updated}'))
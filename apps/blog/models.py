@@ -1,12 +1,18 @@
-from django.db import models
+from secrets import token_hex
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import User
 from django.urls import reverse
-from mptt.models import MPTTModel, TreeForeignKey
+from treebeard.mp_tree import MP_Node
 from taggit.managers import TaggableManager
 from ckeditor.fields import RichTextField
+from pytils.translit import slugify
 
-from apps.services.utils import unique_slugify
+STATUS_DRAFT = 0
+STATUS_PUBLISHED = 1
 
 
 class PostManager(models.Manager):
@@ -18,7 +24,18 @@ class PostManager(models.Manager):
         """
         Список постов (SQL запрос с фильтрацией по статусу опубликованно)
         """
-        return super().get_queryset().select_related('author', 'category').filter(status='published')
+        return (super().get_queryset()
+                .select_related('author', 'category')
+                .annotate(comment_count=Count('comments', filter=Q(comments__status=STATUS_PUBLISHED)))
+                .filter(status=STATUS_PUBLISHED)
+                .order_by('-fixed', '-create'))
+
+    def for_list(self):
+        """
+        Список постов без полного текста (для страниц со списком записей).
+        Обращение к post.text у такого объекта выполнит отдельный запрос.
+        """
+        return self.get_queryset().defer('text')
 
 
 class Post(models.Model):
@@ -26,16 +43,16 @@ class Post(models.Model):
     Модель постов
     """
     STATUS_OPTIONS = (
-        ('published', 'Опубликовано'),
-        ('draft', 'Черновик')
+        (STATUS_PUBLISHED, 'Опубликовано'),
+        (STATUS_DRAFT, 'Черновик')
     )
     title = models.CharField(max_length=255, verbose_name='Название поста')
-    slug = models.SlugField(max_length=255, blank=True, verbose_name='URL')
+    slug = models.SlugField(max_length=255, unique=True, blank=True, verbose_name='URL')
     description = RichTextField(config_name='awesome_ckeditor',
                                 max_length=500,
                                 verbose_name='Краткий текст поста')
-    category = TreeForeignKey('Category', on_delete=models.PROTECT,
-                              related_name='posts', verbose_name='Категория') 
+    category = models.ForeignKey('Category', on_delete=models.PROTECT,
+                                 related_name='posts', verbose_name='Категория')
     text = RichTextField(config_name='awesome_ckeditor',
                          verbose_name='Полный текст поста')
     thumbnail = models.ImageField(
@@ -49,8 +66,8 @@ class Post(models.Model):
             )
         ]
     )
-    status = models.CharField(choices=STATUS_OPTIONS, default='published',
-                              verbose_name='Статус записи', max_length=10)
+    status = models.PositiveSmallIntegerField(choices=STATUS_OPTIONS, default=STATUS_PUBLISHED,
+                                              verbose_name='Статус записи')
     create = models.DateTimeField(auto_now_add=True,
                                   verbose_name='Время добавления')
     update = models.DateTimeField(auto_now=True, verbose_name='Время обновления')
@@ -61,15 +78,22 @@ class Post(models.Model):
                                 verbose_name='Обновил',
                                 related_name='updater_posts')
     fixed = models.BooleanField(verbose_name='Прикреплено', default=False)
+    rating_total = models.IntegerField(default=0, verbose_name='Сумма рейтинга')
 
-    objects = models.Manager()
-    custom = PostManager()
+    objects = PostManager()
+    all_objects = models.Manager()
     tags = TaggableManager()
 
     class Meta:
         db_table = 'blog_post'
+        default_manager_name = 'all_objects'
+        base_manager_name = 'all_objects'
         ordering = ['-fixed', '-create']
-        indexes = [models.Index(fields=['-fixed', '-create', 'status'])]
+        indexes = [
+            models.Index(name='post_pub_idx', fields=['-fixed', '-create'],
+                         condition=Q(status=STATUS_PUBLISHED)),
+            models.Index(fields=['-rating_total']),
+        ]
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
 
@@ -84,18 +108,32 @@ class Post(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        При сохранении генерируем слаг и проверяем на уникальность
+        При сохранении генерируем слаг. Уникальность проверяет индекс базы,
+        при конфликте новая запись или запись со сгенерированным слагом
+        сохраняется повторно со случайным суффиксом
         """
-        self.slug = unique_slugify(self, self.title, self.slug)
-        super().save(*args, **kwargs)
+        slug_generated = not self.slug
+        if slug_generated:
+            self.slug = slugify(self.title)[:248]
+        if not (slug_generated or self._state.adding):
+            return super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            self.slug = f'{slugify(self.title)[:248]}-{token_hex(3)}'
+            super().save(*args, **kwargs)
 
     def get_sum_rating(self):
-        return sum([rating.value for rating in self.ratings.all()])
+        """
+        Сумма рейтинга (поддерживается сигналами модели рейтинга)
+        """
+        return self.rating_total
 
 
-class Category(MPTTModel):
+class Category(MP_Node):
     """
-    Модель категорий с вложенностью
+    Модель категорий с вложенностью (materialized path)
     """
     title = models.CharField(max_length=255,
                              verbose_name='Название категории')
@@ -103,15 +141,8 @@ class Category(MPTTModel):
                             verbose_name='URL категории', blank=True)
     description = models.TextField(max_length=300,
                                    verbose_name='Описание категории')
-    parent = TreeForeignKey('self', on_delete=models.CASCADE, null=True,
-                            blank=True, db_index=True, related_name='children',
-                            verbose_name='Родительская категория')
 
-    class MPTTMeta:
-        """
-        Сортировка по вложенности
-        """
-        order_insertion_by = ('title',)
+    node_order_by = ['title']
 
     class Meta:
         """
@@ -134,14 +165,14 @@ class Category(MPTTModel):
         return self.title
 
 
-class Comment(MPTTModel):
+class Comment(MP_Node):
     """
-    Модель древовидных комментариев
+    Модель древовидных комментариев (materialized path)
     """
 
     STATUS_OPTIONS = (
-        ('published', 'Опубликовано'),
-        ('draft', 'Черновик')
+        (STATUS_PUBLISHED, 'Опубликовано'),
+        (STATUS_DRAFT, 'Черновик')
     )
 
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -155,28 +186,35 @@ class Comment(MPTTModel):
                                        verbose_name='Время добавления')
     time_update = models.DateTimeField(auto_now=True,
                                        verbose_name='Время обновления')
-    status = models.CharField(choices=STATUS_OPTIONS, default='published',
-                              max_length=10, verbose_name='Статус комментария')
-    parent = TreeForeignKey('self', null=True, blank=True, related_name='children',
-                            on_delete=models.CASCADE, verbose_name='Родительский комментарий')
-
-    class MPTTMeta:
-        """
-        Сортировка по вложенности
-        """
-        order_insertion_by = ('-time_create',)
+    status = models.PositiveSmallIntegerField(choices=STATUS_OPTIONS, default=STATUS_PUBLISHED,
+                                              verbose_name='Статус комментария')
 
     class Meta:
         """
-        Сортировка, название модели в админ панели, таблица в данными
+        Индексы, название модели в админ панели (сортировка по path задается менеджером дерева)
         """
-        ordering = ['-time_create']
+        indexes = [models.Index(fields=['post', 'status', '-time_create'])]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return f'{self.author}:{self.content}'
 
+    @classmethod
+    def add_root_comment(cls, comment, attempts=3):
+        """
+        Добавление комментария верхнего уровня. Корни всех постов делят одну
+        последовательность path, а add_root читает последний корень без блокировки:
+        при одновременной вставке путь может совпасть, тогда повторяем попытку
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                with transaction.atomic():
+                    return cls.objects.add_root(instance=comment)
+            except IntegrityError:
+                if attempt == attempts:
+                    raise
+
 
 class Rating(models.Model):
     """
@@ -190,7 +228,8 @@ class Rating(models.Model):
                                 verbose_name='Значение')
     time_create = models.DateTimeField(auto_now_add=True,
                                        verbose_name='Время добавления')
-    ip_address = models.GenericIPAddressField(verbose_name='IP Адрес')
+    ip_address = models.GenericIPAddressField(protocol='both', unpack_ipv4=True,
+                                              verbose_name='IP Адрес')
 
     class Meta:
         unique_together = ('post', 'ip_address')
@@ -201,3 +240,42 @@ class Rating(models.Model):
 
     def __str__(self):
         return self.post.title
+
+    @classmethod
+    def total_subquery(cls):
+        """
+        Сумма оценок поста для UPDATE постов (COALESCE(SUM(value), 0) по OuterRef('pk'))
+        """
+        total = (cls.objects.filter(post_id=OuterRef('pk'))
+                 .order_by()
+                 .values('post_id')
+                 .annotate(total=Sum('value'))
+                 .values('total'))
+        return Coalesce(Subquery(total), 0)
+
+    @staticmethod
+    def lock_post(post_id):
+        """
+        Блокировка строки поста (SELECT ... FOR UPDATE). Все изменения оценок
+        берут её первой, до строк рейтинга, чтобы порядок блокировок был одинаковым
+        """
+        Post.all_objects.select_for_update().filter(pk=post_id).values_list('pk', flat=True).first()
+
+    @classmethod
+    def upsert(cls, post_id, ip_address, value, user=None):
+        """
+        Запись оценки одним запросом INSERT ... ON CONFLICT DO UPDATE.
+        bulk_create не отправляет сигналы, поэтому сумма рейтинга поста пересчитывается здесь же.
+        Строка поста блокируется до записи, чтобы SUM видел оценки параллельных транзакций.
+        Если в той же транзакции до вызова меняются оценки поста, вызывающий код
+        должен взять lock_post раньше них (повторная блокировка здесь ничего не ждёт)
+        """
+        with transaction.atomic():
+            cls.lock_post(post_id)
+            cls.objects.bulk_create(
+                [cls(post_id=post_id, ip_address=ip_address, value=value, user=user)],
+                update_conflicts=True,
+                update_fields=['value', 'user'],
+                unique_fields=['post', 'ip_address'],
+            )
+            Post.all_objects.filter(pk=post_id).update(rating_total=cls.total_subquery())
@@ -0,0 +1,34 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Post, Rating
+
+
+def update_rating_total(post_id, delta):
+    """
+    Атомарное изменение суммы рейтинга поста
+    """
+    if delta:
+        Post.all_objects.filter(pk=post_id).update(rating_total=F('rating_total') + delta)
+
+
+@receiver(pre_save, sender=Rating)
+def remember_rating_value(sender, instance, **kwargs):
+    """
+    Запоминаем прежнее значение оценки перед обновлением
+    """
+    instance._previous_value = 0
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list('value', flat=True).first()
+        instance._previous_value = previous or 0
+
+
+@receiver(post_save, sender=Rating)
+def add_rating_value(sender, instance, created, **kwargs):
+    update_rating_total(instance.post_id, instance.value - instance._previous_value)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_value(sender, instance, **kwargs):
+    update_rating_total(instance.post_id, -instance.value)
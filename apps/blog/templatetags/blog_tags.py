@@ -0,0 +1,14 @@
+from django import template
+
+from apps.blog.models import Category
+from apps.services.utils import build_tree
+
+register = template.Library()
+
+
+@register.simple_tag
+def category_tree():
+    """
+    Дерево категорий для сайдбара одним запросом
+    """
+    return build_tree(Category.objects.all())
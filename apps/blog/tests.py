@@ -1,3 +1,255 @@
-from django.test import TestCase
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .models import Category, Comment, Post, Rating
+from ..services.utils import build_tree, mptt_to_treebeard
+
+
+class RatingTotalTest(TestCase):
+    """
+    Сумма рейтинга поста (Post.rating_total) при голосовании
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', password='password')
+        category = Category.objects.add_root(dict(title='Категория', slug='category', description='Описание'))
+        cls.post = Post.objects.create(title='Запись', description='Описание', text='Текст',
+                                       category=category, author=cls.user)
+
+    def vote(self, value, ip='127.0.0.1'):
+        response = self.client.post(reverse('rating'), {'post_id': self.post.pk, 'value': value},
+                                    REMOTE_ADDR=ip)
+        self.post.refresh_from_db(fields=['rating_total'])
+        return response.json()['rating_sum']
+
+    def test_vote(self):
+        self.assertEqual(self.vote(1), 1)
+        self.assertEqual(self.vote(1, ip='127.0.0.2'), 2)
+        self.assertEqual(self.post.rating_total, 2)
+
+    def test_change_vote(self):
+        self.vote(1)
+        self.assertEqual(self.vote(-1), -1)
+        self.assertEqual(self.post.rating_total, -1)
+        self.assertEqual(Rating.objects.count(), 1)
+
+    def test_unvote(self):
+        self.vote(1)
+        self.vote(-1, ip='127.0.0.2')
+        self.assertEqual(self.vote(1), -1)
+        self.assertEqual(self.post.rating_total, -1)
+        self.assertFalse(Rating.objects.filter(ip_address='127.0.0.1').exists())
+
+    def test_model_save_and_delete(self):
+        rating = Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.1')
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, 1)
+        rating.value = -1
+        rating.save()
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, -1)
+        rating.delete()
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, 0)
+
+    def test_user_delete(self):
+        voter = User.objects.create_user(username='voter', password='password')
+        Rating.objects.create(post=self.post, user=voter, value=1, ip_address='127.0.0.1')
+        Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.2')
+        voter.delete()
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, 1)
+
+    def test_normalize_rating_ips(self):
+        other = Post.objects.create(title='Другая запись', description='Описание', text='Текст',
+                                    category=self.post.category, author=self.user)
+        Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.1')
+        mapped = [
+            Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.2'),
+            Rating.objects.create(post=other, value=1, ip_address='127.0.0.3'),
+        ]
+        # Строки, сохраненные до unpack_ipv4, лежат в IPv4-mapped виде
+        with connection.cursor() as cursor:
+            for rating in mapped:
+                cursor.execute(f'UPDATE {Rating._meta.db_table} SET ip_address = %s WHERE id = %s',
+                               [f'::ffff:{rating.ip_address}', rating.pk])
+        Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.2')
+        call_command('normalize_rating_ips', stdout=StringIO())
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, 2)
+        self.assertEqual(sorted(Rating.objects.values_list('ip_address', flat=True)),
+                         ['127.0.0.1', '127.0.0.2', '127.0.0.3'])
+
+    def test_recalc_rating_totals(self):
+        Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.1')
+        Rating.objects.create(post=self.post, value=1, ip_address='127.0.0.2')
+        Post.all_objects.update(rating_total=0)
+        call_command('recalc_rating_totals', stdout=StringIO())
+        self.post.refresh_from_db(fields=['rating_total'])
+        self.assertEqual(self.post.rating_total, 2)
+
+
+class PostListQueryTest(TestCase):
+    """
+    Список постов загружается одним запросом
+    """
+
+    def test_for_list_single_query(self):
+        user = User.objects.create_user(username='author', password='password')
+        category = Category.objects.add_root(dict(title='Категория', slug='category', description='Описание'))
+        for title in ('Первая', 'Вторая'):
+            Post.objects.create(title=title, description='Описание', text='Текст',
+                                category=category, author=user)
+        with self.assertNumQueries(1):
+            posts = list(Post.objects.for_list())
+            [(post.author.username, post.category.title, post.comment_count) for post in posts]
+
+
+class CommentTreeTest(TestCase):
+    """
+    Добавление комментариев в дерево treebeard
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', password='password')
+        category = Category.objects.add_root(dict(title='Категория', slug='category', description='Описание'))
+        cls.post = Post.objects.create(title='Запись', description='Описание', text='Текст',
+                                       category=category, author=cls.user)
+
+    def test_add_root_comment_retries_path_conflict(self):
+        first = Comment.add_root_comment(Comment(post=self.post, author=self.user, content='Первый'))
+        # Первая попытка не видит уже добавленный корень, как при одновременной вставке
+        with mock.patch.object(type(Comment.objects), 'get_last_root_node', side_effect=[None, first]):
+            second = Comment.add_root_comment(Comment(post=self.post, author=self.user, content='Второй'))
+        self.assertNotEqual(first.path, second.path)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 2)
+
+    def test_build_tree_newest_first(self):
+        first = Comment.add_root_comment(Comment(post=self.post, author=self.user, content='Первый'))
+        Comment.add_root_comment(Comment(post=self.post, author=self.user, content='Второй'))
+        for content in ('Ответ 1', 'Ответ 2'):
+            Comment.objects.add_child(first, instance=Comment(post=self.post, author=self.user, content=content))
+        roots = build_tree(Comment.objects.filter(post=self.post), reverse_siblings=True)
+        self.assertEqual([node.content for node in roots], ['Второй', 'Первый'])
+        self.assertEqual([node.content for node in roots[1].tree_children], ['Ответ 2', 'Ответ 1'])
+
+
+class MpttToTreebeardTest(TestCase):
+    """
+    Перевод дерева django-mptt (parent_id, level) в path/depth/numchild
+    """
+
+    class FakeManager:
+        def __init__(self, nodes):
+            self.nodes = nodes
+            self.updated = None
+
+        def order_by(self, *fields):
+            return sorted(self.nodes, key=lambda node: [getattr(node, field) for field in fields])
+
+        def bulk_update(self, nodes, fields, batch_size=None):
+            self.updated = (nodes, fields)
+
+    def test_convert(self):
+        def node(pk, parent_id, level, time_create):
+            return SimpleNamespace(pk=pk, parent_id=parent_id, level=level, time_create=time_create)
+
+        nodes = [node(1, None, 0, 2), node(2, None, 0, 1), node(3, 2, 1, 5),
+                 node(4, 2, 1, 3), node(5, 4, 2, 4)]
+        manager = self.FakeManager(nodes)
+        apps = SimpleNamespace(get_model=lambda app_label, model_name: SimpleNamespace(objects=manager))
+        mptt_to_treebeard('blog', 'comment', 'time_create')(apps, None)
+        converted = {node.pk: (node.path, node.depth, node.numchild) for node in nodes}
+        self.assertEqual(converted, {
+            2: ('0001', 1, 2),
+            1: ('0002', 1, 0),
+            4: ('00010001', 2, 1),
+            3: ('00010002', 2, 0),
+            5: ('000100010001', 3, 0),
+        })
+        self.assertEqual(manager.updated[1], ['path', 'depth', 'numchild'])
+
+
+class PostSlugTest(TestCase):
+    """
+    Генерация уникального слага поста
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', password='password')
+        cls.category = Category.objects.add_root(dict(title='Категория', slug='category', description='Описание'))
+
+    def create_post(self, title):
+        return Post.objects.create(title=title, description='Описание', text='Текст',
+                                   category=self.category, author=self.user)
+
+    def test_duplicate_title_on_create(self):
+        first = self.create_post('Привет мир')
+        second = self.create_post('Привет мир')
+        self.assertEqual(first.slug, 'privet-mir')
+        self.assertTrue(second.slug.startswith('privet-mir-'))
+
+    def test_cleared_slug_on_update(self):
+        self.create_post('Привет мир')
+        second = self.create_post('Привет мир')
+        second.slug = ''
+        second.save()
+        self.assertTrue(second.slug.startswith('privet-mir-'))
+        self.assertEqual(Post.all_objects.filter(slug__startswith='privet-mir').count(), 2)
+
+
+class ConvertStatusCommandTest(TestCase):
+    """
+    Команда перевода статусов в числа не трогает уже числовую колонку
+    """
+
+    def test_skips_integer_status(self):
+        out = StringIO()
+        call_command('convert_status_to_int', stdout=out)
+        self.assertEqual(out.getvalue().count('статус уже хранится числом'), 2)
+
+
+class ConvertStatusVarcharTest(TransactionTestCase):
+    """
+    Команда переводит строковые статусы 'published'/'draft' в 1/0
+    """
+
+    def alter_status(self, old_field, new_field):
+        with connection.schema_editor() as editor:
+            editor.alter_field(Post, old_field, new_field)
+
+    def test_maps_string_status(self):
+        user = User.objects.create_user(username='author', password='pass')
+        category = Category.objects.add_root(dict(title='Категория', slug='category', description='Описание'))
+        published = Post.all_objects.create(title='Опубликован', slug='published', text='Текст', author=user, category=category)
+        draft = Post.all_objects.create(title='Черновик', slug='draft', text='Текст', author=user, category=category)
+
+        int_field = Post._meta.get_field('status')
+        char_field = models.CharField(max_length=10, default='published')
+        char_field.set_attributes_from_name('status')
+        char_field.model = Post
+        self.alter_status(int_field, char_field)
+        table = Post._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {table} SET status = %s WHERE id = %s', ['published', published.pk])
+            cursor.execute(f'UPDATE {table} SET status = %s WHERE id = %s', ['draft', draft.pk])
+
+        out = StringIO()
+        call_command('convert_status_to_int', stdout=out)
+        self.alter_status(char_field, int_field)
+
+        self.assertIn(f'{table}: обновлено строк 2', out.getvalue())
+        self.assertEqual(
+            dict(Post.all_objects.values_list('pk', 'status')),
+            {published.pk: 1, draft.pk: 0},
+        )
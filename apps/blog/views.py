@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.utils.formats import date_format
@@ -7,9 +8,10 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from taggit.models import Tag
 
-from .models import Post, Category, Rating
+from .models import Post, Category, Comment, Rating
 from .forms import PostCreateForm, PostUpdateForm, CommentCreateForm
 from ..services.mixins import AuthorRequiredMixin
+from ..services.utils import build_tree
 
 
 class PostListView(ListView):
@@ -20,7 +22,7 @@ class PostListView(ListView):
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     paginate_by = 2
-    queryset = Post.custom.all()
+    queryset = Post.objects.for_list()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -37,11 +39,16 @@ class PostDetailView(DetailView):
     model = Post
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
+    queryset = Post.all_objects.select_related('author', 'category').prefetch_related('tags')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = self.object.title
         context['form'] = CommentCreateForm
+        context['comments'] = build_tree(
+            self.object.comments.select_related('author__profile').order_by('path'),
+            reverse_siblings=True,
+        )
         return context
 
 
@@ -56,10 +63,10 @@ class PostFromCategory(ListView):
 
     def get_queryset(self):
         self.category = Category.objects.get(slug=self.kwargs['slug'])
-        queryset = Post.custom.filter(category=self.category)
+        queryset = Post.objects.for_list().filter(category=self.category)
         if not queryset:
-            sub_cat = Category.objects.filter(parent=self.category)
-            queryset = Post.custom.filter(category__in=sub_cat)
+            sub_cat = Category.objects.get_children(self.category)
+            queryset = Post.objects.for_list().filter(category__in=sub_cat)
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -128,15 +135,19 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         comment = form.save(commit=False)
         comment.post_id = self.kwargs.get('pk')
         comment.author = self.request.user
-        comment.parent_id = form.cleaned_data.get('parent')
-        comment.save()
+        parent_id = form.cleaned_data.get('parent')
+        if parent_id:
+            parent = Comment.objects.get(pk=parent_id)
+            comment = Comment.objects.add_child(parent, instance=comment)
+        else:
+            comment = Comment.add_root_comment(comment)
 
         if self.is_ajax():
             return JsonResponse({
-                'is_child': comment.is_child_node(),
+                'is_child': not comment.is_root(),
                 'id': comment.id,
                 'author': comment.author.username,
-                'parent_id': comment.parent_id,
+                'parent_id': parent_id,
                 'time_create': date_format(
                     localtime(comment.time_create),
                     format='DATETIME_FORMAT',
@@ -165,7 +176,7 @@ class PostByTagListView(ListView):
 
     def get_queryset(self):
         self.tag = Tag.objects.get(slug=self.kwargs['tag'])
-        queryset = Post.objects.filter(tags__slug=self.tag.slug)
+        queryset = Post.objects.for_list().filter(tags__slug=self.tag.slug)
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -183,19 +194,13 @@ class RatingCreateView(View):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         ip = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
         user = request.user if request.user.is_authenticated else None
-        rating, created = self.model.objects.get_or_create(
-           post_id=post_id,
-            ip_address=ip,
-            defaults={'value': value, 'user': user},
-        )
-        if not created:
-            if rating.value == value:
-                rating.delete()
-            else:
-                rating.value = value
-                rating.user = user
-                rating.save()
-        return JsonResponse({'rating_sum': rating.post.get_sum_rating()})
+        with transaction.atomic():
+            self.model.lock_post(post_id)
+            deleted, _ = self.model.objects.filter(post_id=post_id, ip_address=ip, value=value).delete()
+            if not deleted:
+                self.model.upsert(post_id, ip, value, user)
+        rating_sum = Post.all_objects.values_list('rating_total', flat=True).get(pk=post_id)
+        return JsonResponse({'rating_sum': rating_sum})
 
 
 def tr_handler404(request, exception):
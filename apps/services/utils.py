@@ -1,5 +1,6 @@
 from uuid import uuid4
 from pytils.translit import slugify
+from treebeard.mp_tree import MP_Node
 
 
 def unique_slugify(instance, slug, slug_field):
@@ -12,3 +13,66 @@ def unique_slugify(instance, slug, slug_field):
     if model.objects.filter(slug=slug_field).exclude(id=instance.id).exists():
         slug_field = f'{slugify(slug)}-{uuid4().hex[:8]}'
     return slug_field
+
+
+def build_tree(nodes, reverse_siblings=False):
+    """
+    Сборка дерева из узлов treebeard (отсортированных по path) за один проход.
+    Дочерние узлы складываются в атрибут tree_children; reverse_siblings выводит
+    соседей в обратном порядке (новые комментарии сверху).
+    """
+    roots, parents = [], {}
+    for node in nodes:
+        node.tree_children = []
+        parent = parents.get(node.path[:-node.steplen])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.tree_children.append(node)
+        parents[node.path] = node
+    if reverse_siblings:
+        roots.reverse()
+        for node in parents.values():
+            node.tree_children.reverse()
+    return roots
+
+
+def mptt_to_treebeard(app_label, model_name, *sibling_order):
+    """
+    Функция для RunPython: перевод существующего дерева django-mptt на treebeard MP_Node.
+    Узлы обходятся по уровням (level), соседи - в порядке sibling_order; по parent_id
+    каждому узлу строится path, заполняются depth и numchild.
+
+    Комментарии нумеруются от старых к новым, как их дальше добавляют add_root/add_child
+    (новый узел - последний); порядок MPTT "новые сверху" сохраняется при выводе
+    через build_tree(..., reverse_siblings=True).
+
+    Миграция приложения blog собирается вручную в таком порядке:
+
+        AddField path = CharField(max_length=255, null=True),
+                 depth = PositiveIntegerField(default=1),
+                 numchild = PositiveIntegerField(default=0)      # для category и comment
+        RunPython(mptt_to_treebeard('blog', 'category', 'title'), RunPython.noop)
+        RunPython(mptt_to_treebeard('blog', 'comment', 'time_create'), RunPython.noop)
+        AlterField path = CharField(max_length=255, unique=True) # для category и comment
+        RemoveField parent, lft, rght, tree_id, level             # для category и comment
+
+    Оставшиеся изменения (default у depth, Meta комментария, category у Post)
+    makemigrations после этого сгенерирует отдельной миграцией. После migrate
+    проверить дерево: Category.find_problems() и Comment.find_problems() должны
+    вернуть только пустые списки.
+    """
+    def forwards(apps, schema_editor):
+        model = apps.get_model(app_label, model_name)
+        nodes = list(model.objects.order_by('level', *sibling_order))
+        paths, numchild = {}, {}
+        for node in nodes:
+            position = numchild.get(node.parent_id, 0) + 1
+            numchild[node.parent_id] = position
+            node.path = paths.get(node.parent_id, '') + MP_Node._get_path(None, 1, position)
+            node.depth = len(node.path) // MP_Node.steplen
+            paths[node.pk] = node.path
+        for node in nodes:
+            node.numchild = numchild.get(node.pk, 0)
+        model.objects.bulk_update(nodes, ['path', 'depth', 'numchild'], batch_size=500)
+    return forwards
@@ -47,8 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'apps.blog.apps.BlogConfig',
-    'mptt',
-    'django_mptt_admin',
+    'treebeard',
     'debug_toolbar',
     'apps.accounts.apps.AccountsConfig',
     'taggit',